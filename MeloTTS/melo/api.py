@@ -64,12 +64,14 @@ class TTS(nn.Module):
 
     @staticmethod
     def audio_numpy_concat(segment_data_list, sr, speed=1.):
+        silence = np.zeros(int((sr * 0.05) / speed), dtype=np.float32)
         audio_segments = []
         for segment_data in segment_data_list:
-            audio_segments += segment_data.reshape(-1).tolist()
-            audio_segments += [0] * int((sr * 0.05) / speed)
-        audio_segments = np.array(audio_segments).astype(np.float32)
-        return audio_segments
+            audio_segments.append(segment_data.reshape(-1))
+            audio_segments.append(silence)
+        if not audio_segments:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(audio_segments).astype(np.float32, copy=False)
 
     @staticmethod
     def split_sentences_into_pieces(text, language, quiet=False):
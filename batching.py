@@ -0,0 +1,417 @@
+"""
+Dynamic request batching for MeloTTS inference
+"""
+
+import asyncio
+import logging
+import queue
+import re
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+from melo import commons
+from melo.api import TTS
+from melo.text import cleaned_text_to_sequence, get_bert
+from melo.text.cleaner import clean_text
+
+from cache import LRUCache
+
+logger = logging.getLogger("melo-tts-api")
+
+# Inference parameters matching the MeloTTS `tts_to_file` defaults
+SDP_RATIO = 0.2
+NOISE_SCALE = 0.6
+NOISE_SCALE_W = 0.8
+
+# Reduced-precision modes accepted by `settings.PRECISION`
+DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}
+
+# Channel widths of the model's two BERT inputs
+BERT_DIM = 1024
+JA_BERT_DIM = 768
+
+# Languages whose BERT features feed the model's `ja_bert` input (ZH uses `bert`)
+JA_BERT_LANGUAGES = ['JP', 'EN', 'ZH_MIX_EN', 'KR', 'SP', 'ES', 'FR', 'DE', 'RU']
+
+class TextFeatures(NamedTuple):
+    """Frontend output for a single sentence
+
+    At most one of `bert`/`ja_bert` is used per language; the other is None rather than
+    an all-zero tensor, which would double the memory held by the frontend cache.
+    """
+    bert: Optional[torch.Tensor]
+    ja_bert: Optional[torch.Tensor]
+    phones: torch.Tensor
+    tones: torch.Tensor
+    lang_ids: torch.Tensor
+
+class _Phonemes(NamedTuple):
+    """G2P output for a single sentence, before BERT features are attached"""
+    norm_text: str
+    word2ph: List[int]
+    phones: torch.Tensor
+    tones: torch.Tensor
+    lang_ids: torch.Tensor
+
+class _StagedBatch(NamedTuple):
+    """Padded batch inputs, already being copied to the model device on CUDA"""
+    inputs: Tuple[torch.Tensor, ...]  # x, x_lengths, sid, tones, lang_ids, bert, ja_bert
+    max_len: int
+    ready: Optional["torch.cuda.Event"]  # recorded on the copy stream once the copies are issued
+
+class _PendingItem(NamedTuple):
+    """A sentence waiting in the batch queue"""
+    features: TextFeatures
+    speaker_id: int
+    speed: float
+    future: asyncio.Future
+
+def _features_nbytes(features: TextFeatures) -> int:
+    """Host memory held by one frontend cache entry"""
+    return sum(tensor.nelement() * tensor.element_size() for tensor in features if tensor is not None)
+
+class InferenceWorker:
+    """Dedicated thread that owns every model forward pass (and its CUDA stream)
+
+    Funnelling all GPU work through one thread serializes it explicitly instead of
+    having several executor threads contend for the same CUDA context.
+    """
+
+    def __init__(self, device: str):
+        self._jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._stream = torch.cuda.Stream(device=device) if 'cuda' in device else None
+        self._thread = threading.Thread(target=self._loop, name="tts-inference", daemon=True)
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Finish queued jobs and stop the worker thread"""
+        self._jobs.put(None)
+        self._thread.join()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Schedule a call on the worker thread"""
+        future: Future = Future()
+        self._jobs.put((fn, args, future))
+        return future
+
+    def _loop(self) -> None:
+        """Run jobs one at a time, synchronizing the stream once per job"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            fn, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self._stream is not None:
+                    with torch.cuda.stream(self._stream):
+                        result = fn(*args)
+                    self._stream.synchronize()
+                else:
+                    result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+class TTSBatcher:
+    """Pools concurrent synthesis requests and runs them through the model in batches"""
+
+    def __init__(
+        self,
+        model: TTS,
+        worker: InferenceWorker,
+        executor: Executor,
+        max_batch_size: int = 8,
+        batch_timeout: float = 0.01,
+        max_pending: int = 64,
+        precision: str = "fp32",
+        frontend_cache_size: int = 512,
+        frontend_cache_bytes: int = 128 << 20
+    ):
+        self.model = model
+        self.worker = worker
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.batch_timeout = batch_timeout
+        self.dtype = DTYPES.get(precision)
+        self._copy_stream = torch.cuda.Stream(device=model.device) if 'cuda' in model.device else None
+        # Frontend output is deterministic per (language, sentence); the cached tensors are only read
+        self._frontend_cache = LRUCache(
+            maxsize=frontend_cache_size, maxbytes=frontend_cache_bytes, sizeof=_features_nbytes
+        )
+        self._semaphore = asyncio.Semaphore(max_pending)
+        self._queue: "asyncio.Queue[_PendingItem]" = asyncio.Queue()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        """Start the background batching loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching loop and fail any requests still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def synthesize(self, text: str, speaker_id: int, speed: float) -> np.ndarray:
+        """Synthesize text as float32 audio, batching its sentences with other in-flight requests"""
+        pieces = [piece async for piece in self.stream(text, speaker_id, speed)]
+        if not pieces:
+            # Text such as "()" passes validation but splits into no sentences
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(pieces).astype(np.float32, copy=False)
+
+    async def stream(self, text: str, speaker_id: int, speed: float) -> AsyncIterator[np.ndarray]:
+        """Yield float32 audio sentence by sentence, in order, as each one finishes inference"""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            sentences = self.model.split_sentences_into_pieces(text, self.model.language, quiet=True)
+            futures = [loop.create_future() for _ in sentences]
+            producer = loop.create_task(self._enqueue(sentences, speaker_id, speed, futures))
+            silence = np.zeros(int((self.model.hps.data.sampling_rate * 0.05) / speed), dtype=np.float32)
+            try:
+                for future in futures:
+                    yield await future
+                    yield silence
+            finally:
+                # Client went away or a sentence failed: drop whatever is still pending
+                producer.cancel()
+                for future in futures:
+                    future.cancel()
+
+    async def _enqueue(
+        self, sentences: List[str], speaker_id: int, speed: float, futures: List[asyncio.Future]
+    ) -> None:
+        """Run the frontend for each sentence and queue it for batched inference"""
+        for sentence, future in zip(sentences, futures):
+            try:
+                features = await self._frontend(sentence)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            await self._queue.put(_PendingItem(features, speaker_id, speed, future))
+
+    def compile(self, mode: str = "default") -> None:
+        """Compile the flow and vocoder, which dominate inference time, with torch.compile
+
+        Their frame axis follows the predicted durations, so every request has a new shape.
+        The default mode compiles one dynamic-shape graph for that; CUDA-graph modes such as
+        "reduce-overhead" would record a fresh graph per (batch, frames) shape without bound.
+        """
+        synthesizer = self.model.model
+        synthesizer.flow = torch.compile(synthesizer.flow, mode=mode, dynamic=True, fullgraph=False)
+        synthesizer.dec = torch.compile(synthesizer.dec, mode=mode, dynamic=True, fullgraph=False)
+
+    async def warmup(self, text: str, speaker_id: int) -> None:
+        """Synthesize once alone and once as a batch of two to trigger the initial compiles at startup
+
+        torch.compile specializes size-1 dimensions, so a single request and a real batch each
+        need their own graph; shapes do not depend on the speaker, so one speaker is enough.
+        Dynamo also guards on ranges of the frame length, so a later request whose length falls
+        outside the warmed-up range can still recompile once.
+        """
+        await self.synthesize(text, speaker_id, 1.0)
+        await asyncio.gather(*[self.synthesize(text, speaker_id, 1.0) for _ in range(2)])
+
+    async def _frontend(self, sentence: str) -> TextFeatures:
+        """Return frontend features for one sentence, reusing cached results"""
+        language = self.model.language
+        features = self._frontend_cache.get((language, sentence))
+        if features is None:
+            # G2P is pure CPU work for the pool; BERT runs on the model device, so it goes
+            # through the inference worker like every other forward pass
+            loop = asyncio.get_running_loop()
+            phonemes = await loop.run_in_executor(self.executor, self._g2p, language, sentence)
+            bert, ja_bert = await asyncio.wrap_future(self.worker.submit(self._bert, language, phonemes))
+            features = TextFeatures(bert, ja_bert, phonemes.phones, phonemes.tones, phonemes.lang_ids)
+            self._frontend_cache.put((language, sentence), features)
+        return features
+
+    def _g2p(self, language: str, sentence: str) -> _Phonemes:
+        """Run text normalization, G2P and symbol encoding for one sentence (CPU only)"""
+        if language in ['EN', 'ZH_MIX_EN']:
+            sentence = re.sub(r'([a-z])([A-Z])', r'\1 \2', sentence)
+        norm_text, phones, tones, word2ph = clean_text(sentence, language)
+        phones, tones, lang_ids = cleaned_text_to_sequence(phones, tones, language, self.model.symbol_to_id)
+        if self.model.hps.data.add_blank:
+            phones = commons.intersperse(phones, 0)
+            tones = commons.intersperse(tones, 0)
+            lang_ids = commons.intersperse(lang_ids, 0)
+            word2ph = [count * 2 for count in word2ph]
+            word2ph[0] += 1
+        return _Phonemes(
+            norm_text, word2ph, torch.LongTensor(phones), torch.LongTensor(tones), torch.LongTensor(lang_ids)
+        )
+
+    def _bert(
+        self, language: str, phonemes: _Phonemes
+    ) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor]]:
+        """Compute the `bert` and `ja_bert` inputs for one sentence (runs on the inference worker)"""
+        if getattr(self.model.hps.data, "disable_bert", False):
+            return None, None
+        length = phonemes.phones.size(0)
+        features = get_bert(phonemes.norm_text, phonemes.word2ph, language, self.model.device)
+        assert features.shape[-1] == length, f"Bert seq len {features.shape[-1]} != {length}"
+        if language == "ZH":
+            return features, None
+        if language in JA_BERT_LANGUAGES:
+            return None, features
+        raise NotImplementedError(f"No BERT frontend for language '{language}'")
+
+    async def _collect_batch(self) -> List[_PendingItem]:
+        """Wait for one item, then gather more until the batch is full or the window closes"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_timeout
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        """Background loop draining the queue into batched forward passes
+
+        One group is in flight on the worker at a time. The next group is staged (padded and its
+        device copies issued) before the in-flight one is awaited, so those copies overlap its compute.
+        """
+        loop = asyncio.get_running_loop()
+        inflight: Optional[Tuple[List[_PendingItem], Future]] = None
+        try:
+            while True:
+                if inflight is not None and self._queue.empty():
+                    # Nothing to stage behind it, so hand its results back right away
+                    await self._deliver(*inflight)
+                    inflight = None
+                batch = [item for item in await self._collect_batch() if not item.future.done()]
+
+                # length_scale is a scalar in `infer`, so only equal speeds share a forward pass
+                groups: Dict[float, List[_PendingItem]] = {}
+                for item in batch:
+                    groups.setdefault(item.speed, []).append(item)
+
+                for speed, items in groups.items():
+                    try:
+                        staged = await loop.run_in_executor(self.executor, self._stage, items)
+                    except Exception as e:
+                        self._fail(items, e)
+                        continue
+                    if inflight is not None:
+                        await self._deliver(*inflight)
+                    inflight = (items, self.worker.submit(self._infer_batch, staged, speed))
+        finally:
+            if inflight is not None:
+                self._fail(inflight[0], RuntimeError("Batcher stopped"))
+
+    async def _deliver(self, items: List[_PendingItem], future: Future) -> None:
+        """Wait for a submitted group and resolve its items with their audio"""
+        try:
+            audios = await asyncio.wrap_future(future)
+        except Exception as e:
+            self._fail(items, e)
+            return
+        for item, audio in zip(items, audios):
+            if not item.future.done():
+                item.future.set_result(audio)
+
+    def _fail(self, items: List[_PendingItem], error: BaseException) -> None:
+        """Fail every still-pending item of a group"""
+        logger.error("❌ Batched inference failed (%d items): %s", len(items), error)
+        for item in items:
+            if not item.future.done():
+                item.future.set_exception(error)
+
+    def _stage(self, items: List[_PendingItem]) -> _StagedBatch:
+        """Pad a group of sentences into one batch and start copying it to the model device
+
+        On CUDA the batch is padded in pinned host memory and copied with non_blocking transfers
+        on a side stream, which run while the worker is still computing the previous group.
+        """
+        lengths = [item.features.phones.size(0) for item in items]
+        batch_size, max_len = len(items), max(lengths)
+
+        pin = self._copy_stream is not None
+        x = torch.zeros(batch_size, max_len, dtype=torch.long, pin_memory=pin)
+        tones = torch.zeros(batch_size, max_len, dtype=torch.long, pin_memory=pin)
+        lang_ids = torch.zeros(batch_size, max_len, dtype=torch.long, pin_memory=pin)
+        bert = torch.zeros(batch_size, BERT_DIM, max_len, pin_memory=pin)
+        ja_bert = torch.zeros(batch_size, JA_BERT_DIM, max_len, pin_memory=pin)
+        for i, (item, length) in enumerate(zip(items, lengths)):
+            x[i, :length] = item.features.phones
+            tones[i, :length] = item.features.tones
+            lang_ids[i, :length] = item.features.lang_ids
+            # Unused BERT inputs are left as the zeros they were allocated with
+            if item.features.bert is not None:
+                bert[i, :, :length] = item.features.bert
+            if item.features.ja_bert is not None:
+                ja_bert[i, :, :length] = item.features.ja_bert
+        x_lengths = torch.tensor(lengths, dtype=torch.long, pin_memory=pin)
+        sid = torch.tensor([item.speaker_id for item in items], dtype=torch.long, pin_memory=pin)
+        inputs = (x, x_lengths, sid, tones, lang_ids, bert, ja_bert)
+
+        if self._copy_stream is None:
+            # Off CUDA the worker moves the host tensors itself
+            return _StagedBatch(inputs, max_len, None)
+        with torch.cuda.stream(self._copy_stream):
+            inputs = tuple(tensor.to(self.model.device, non_blocking=True) for tensor in inputs)
+            ready = torch.cuda.Event()
+            ready.record()
+        return _StagedBatch(inputs, max_len, ready)
+
+    def _infer_batch(self, staged: _StagedBatch, speed: float) -> List[np.ndarray]:
+        """Run the model on a staged batch and split the audio back out"""
+        if staged.ready is not None:
+            compute_stream = torch.cuda.current_stream()
+            compute_stream.wait_event(staged.ready)
+            for tensor in staged.inputs:
+                # Allocated on the copy stream but consumed on the compute stream
+                tensor.record_stream(compute_stream)
+
+        with torch.inference_mode(), torch.autocast("cuda", dtype=self.dtype, enabled=self.dtype is not None):
+            x, x_lengths, sid, tones, lang_ids, bert, ja_bert = [
+                tensor.to(self.model.device) for tensor in staged.inputs
+            ]
+            if self.dtype is not None:
+                bert, ja_bert = bert.to(self.dtype), ja_bert.to(self.dtype)
+            audio, _, y_mask, _ = self.model.model.infer(
+                x,
+                x_lengths,
+                sid,
+                tones,
+                lang_ids,
+                bert,
+                ja_bert,
+                sdp_ratio=SDP_RATIO,
+                noise_scale=NOISE_SCALE,
+                noise_scale_w=NOISE_SCALE_W,
+                length_scale=1. / speed,
+            )
+            # Back to fp32 before PCM conversion; sum the mask in fp32 so long utterances stay exact
+            audio = audio[:, 0].float().cpu().numpy()
+            audio_lengths = (y_mask.float().sum(dim=(1, 2)).long() * self.model.hps.data.hop_length).tolist()
+
+        batch_size = len(audio_lengths)
+        logger.debug("⚡ Batched forward | size=%d, max_phonemes=%d, speed=%s", batch_size, staged.max_len, speed)
+        return [audio[i, :audio_lengths[i]] for i in range(batch_size)]
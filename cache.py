@@ -0,0 +1,70 @@
+"""
+Caching helpers for synthesized audio
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import diskcache
+
+class LRUCache:
+    """Bounded least-recently-used mapping of cache keys to audio bytes (or other sized values)
+
+    `maxsize` caps the number of entries; a positive `maxbytes` also caps their total
+    size as measured by `sizeof`, so a few large entries cannot exhaust memory.
+    """
+
+    def __init__(self, maxsize: int = 256, maxbytes: int = 0, sizeof: Callable[[Any], int] = len):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value and mark it as recently used, or None on a miss"""
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting least recently used entries while over either bound"""
+        size = self.sizeof(value)
+        if self.maxsize <= 0 or 0 < self.maxbytes < size:
+            return
+        if key in self._data:
+            self.nbytes -= self.sizeof(self._data.pop(key))
+        self._data[key] = value
+        self.nbytes += size
+        while len(self._data) > self.maxsize or 0 < self.maxbytes < self.nbytes:
+            _, evicted = self._data.popitem(last=False)
+            self.nbytes -= self.sizeof(evicted)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class DiskCache:
+    """On-disk audio cache shared by every worker process pointed at the same directory"""
+
+    def __init__(self, directory: str, size_limit: int, namespace: str = ""):
+        self.namespace = namespace
+        self._cache = diskcache.Cache(directory, size_limit=size_limit)
+
+    def digest(self, key: Tuple) -> bytes:
+        """Stable cross-process key for a cache tuple (Python's hash() is salted per process)"""
+        raw = "|".join(str(part) for part in (self.namespace, *key))
+        return hashlib.sha1(raw.encode("utf-8")).digest()
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        """Return the cached value, or None on a miss"""
+        return self._cache.get(self.digest(key))
+
+    def put(self, key: Tuple, value: bytes) -> None:
+        """Store a value; diskcache evicts old entries once size_limit is exceeded"""
+        self._cache.set(self.digest(key), value)
+
+    def close(self) -> None:
+        """Close the underlying database handles"""
+        self._cache.close()
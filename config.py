@@ -2,6 +2,7 @@
 Configuration settings for MeloTTS API
 """
 
+import functools
 import os
 from typing import List
 
@@ -15,12 +16,33 @@ class Settings:
     # Model settings
     DEVICE: str = os.getenv("DEVICE", "auto")  # auto, cpu, cuda, mps
     LANGUAGE: str = os.getenv("LANGUAGE", "EN")
-    MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", "4"))
+    PRECISION: str = os.getenv("PRECISION", "fp32")  # fp32, bf16, fp16 (reduced precision is CUDA only)
+    COMPILE_MODEL: bool = os.getenv("COMPILE_MODEL", "false").lower() in ("1", "true", "yes")
+    WARMUP_TEXT: str = os.getenv("WARMUP_TEXT", "This is a warmup sentence.")
+    MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", str(os.cpu_count() or 4)))  # CPU pool size
+    
+    # Batching settings
+    MAX_BATCH_SIZE: int = int(os.getenv("MAX_BATCH_SIZE", "8"))
+    BATCH_TIMEOUT: float = float(os.getenv("BATCH_TIMEOUT", "0.01"))  # seconds to wait for a batch to fill
+    MAX_PENDING_REQUESTS: int = int(os.getenv("MAX_PENDING_REQUESTS", "64"))
     
     # API settings
     MAX_TEXT_LENGTH: int = int(os.getenv("MAX_TEXT_LENGTH", "1000"))
     DEFAULT_SPEAKER: str = os.getenv("DEFAULT_SPEAKER", "EN-US")
     DEFAULT_SPEED: float = float(os.getenv("DEFAULT_SPEED", "1.0"))
+    MP3_BITRATE: int = int(os.getenv("MP3_BITRATE", "128"))  # kbps
+    
+    # Cache settings
+    WAV_CACHE_SIZE: int = int(os.getenv("WAV_CACHE_SIZE", "256"))  # 0 disables caching
+    WAV_CACHE_BYTES: int = int(os.getenv("WAV_CACHE_BYTES", str(256 << 20)))  # their total size
+    FRONTEND_CACHE_SIZE: int = int(os.getenv("FRONTEND_CACHE_SIZE", "512"))  # cached sentence features
+    FRONTEND_CACHE_BYTES: int = int(os.getenv("FRONTEND_CACHE_BYTES", str(128 << 20)))  # their total size
+    # Phrases pre-synthesized for every speaker at startup, separated by "|" (empty disables)
+    PREVIEW_PHRASES: List[str] = [
+        phrase.strip()
+        for phrase in os.getenv("PREVIEW_PHRASES", "Hello! This is a preview of my voice.").split("|")
+        if phrase.strip()
+    ]
     
     # CORS settings
     CORS_ORIGINS: List[str] = os.getenv("CORS_ORIGINS", "*").split(",")
@@ -31,9 +53,14 @@ class Settings:
     # Model paths
     MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "./models")
     
+    # Shared on-disk audio cache (empty WAV_CACHE_DIR disables it)
+    WAV_CACHE_DIR: str = os.getenv("WAV_CACHE_DIR", os.path.join(MODEL_CACHE_DIR, "wav_cache"))
+    WAV_CACHE_SIZE_LIMIT: int = int(os.getenv("WAV_CACHE_SIZE_LIMIT", str(2 << 30)))  # bytes
+    
     @classmethod
+    @functools.lru_cache(maxsize=1)
     def get_device(cls) -> str:
-        """Get the appropriate device for model inference"""
+        """Get the appropriate device for model inference (probed once, then cached)"""
         if cls.DEVICE == "auto":
             try:
                 import torch
@@ -46,6 +73,19 @@ class Settings:
             except ImportError:
                 return "cpu"
         return cls.DEVICE
+    
+    @classmethod
+    def get_compile_model(cls) -> bool:
+        """Whether to torch.compile the model; only honoured on CUDA, where compiles are fast enough to warm up"""
+        return cls.COMPILE_MODEL and "cuda" in cls.get_device()
+    
+    @classmethod
+    def get_precision(cls) -> str:
+        """Get the inference precision, falling back to fp32 when not running on CUDA"""
+        precision = cls.PRECISION.lower()
+        if precision in ("bf16", "fp16") and "cuda" in cls.get_device():
+            return precision
+        return "fp32"
 
 # Global settings instance
 settings = Settings()
@@ -1,16 +1,25 @@
 from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+import uvicorn
 from melo.api import TTS
-import io
+import hashlib
 import logging
+import os
+import tempfile
 import time
-from pydub import AudioSegment
-import base64
+import struct
+import lameenc
+import numpy as np
+import binascii
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 from contextlib import asynccontextmanager
 
+from batching import DTYPES, InferenceWorker, TTSBatcher
+from cache import DiskCache, LRUCache
 from config import settings
 from models import (
     TTSRequest, TTSResponse, HealthResponse, SpeakersResponse, APIInfo
@@ -24,6 +33,8 @@ logging.basicConfig(
 logger = logging.getLogger("melo-tts-api")
 
 # App & Executor Setup
+# CPU-bound work (G2P, audio encoding) runs on the pool; model forwards, including
+# the frontend's BERT pass, run on a single dedicated inference thread created at startup
 executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
 app = FastAPI(
     title="MeloTTS-API",
@@ -45,22 +56,59 @@ app.add_middleware(
 # Global model and state
 tts_model = None
 speakers = []
+SPK_ID: Dict[str, int] = {}
+SPK_SET: frozenset = frozenset()
 model_ready = False
 startup_time = None
+inference_worker = None
+batcher = None
+pcm_cache = LRUCache(maxsize=settings.WAV_CACHE_SIZE, maxbytes=settings.WAV_CACHE_BYTES)
+disk_cache = None
+preview_cache: Dict[Tuple[str, int, float], bytes] = {}
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    global tts_model, speakers, model_ready, startup_time
+    global tts_model, speakers, SPK_ID, SPK_SET, model_ready, startup_time, inference_worker, batcher, disk_cache
     startup_time = time.time()
     
     try:
         logger.info("🚀 Starting MeloTTS API...")
-        logger.info("📊 Configuration: device=%s, language=%s", settings.get_device(), settings.LANGUAGE)
+        logger.info(
+            "📊 Configuration: device=%s, language=%s, precision=%s",
+            settings.get_device(), settings.LANGUAGE, settings.get_precision()
+        )
         
         # Load model
         logger.info("📥 Loading MeloTTS model...")
         tts_model = TTS(language=settings.LANGUAGE, device=settings.get_device())
-        speakers = list(tts_model.hps.data.spk2id.keys())
+        SPK_ID = dict(tts_model.hps.data.spk2id)
+        SPK_SET = frozenset(SPK_ID)
+        speakers = list(SPK_ID)
+        if settings.WAV_CACHE_DIR:
+            # Keys include the language because speaker ids are only unique per model
+            disk_cache = DiskCache(settings.WAV_CACHE_DIR, settings.WAV_CACHE_SIZE_LIMIT, namespace=settings.LANGUAGE)
+        if settings.get_precision() in DTYPES:
+            tts_model.model = tts_model.model.to(dtype=DTYPES[settings.get_precision()])
+        inference_worker = InferenceWorker(tts_model.device)
+        inference_worker.start()
+        batcher = TTSBatcher(
+            tts_model,
+            inference_worker,
+            executor,
+            max_batch_size=settings.MAX_BATCH_SIZE,
+            batch_timeout=settings.BATCH_TIMEOUT,
+            max_pending=settings.MAX_PENDING_REQUESTS,
+            precision=settings.get_precision(),
+            frontend_cache_size=settings.FRONTEND_CACHE_SIZE,
+            frontend_cache_bytes=settings.FRONTEND_CACHE_BYTES
+        )
+        batcher.start()
+        if settings.get_compile_model():
+            logger.info("🔧 Compiling model and warming up...")
+            batcher.compile()
+            await batcher.warmup(settings.WARMUP_TEXT, next(iter(SPK_ID.values())))
+        if settings.PREVIEW_PHRASES:
+            await _load_previews()
         model_ready = True
         
         load_time = time.time() - startup_time
@@ -75,6 +123,12 @@ async def lifespan(_app: FastAPI):
         raise
     finally:
         logger.info("🛑 Shutting down MeloTTS API...")
+        if batcher is not None:
+            await batcher.stop()
+        if inference_worker is not None:
+            inference_worker.stop()
+        if disk_cache is not None:
+            disk_cache.close()
         executor.shutdown(wait=True)
         logger.info("✅ Shutdown complete")
 
@@ -87,7 +141,7 @@ def root():
         name="MeloTTS-API",
         version="1.0.0",
         description="High-performance Text-to-Speech API service powered by MeloTTS",
-        endpoints=["/tts", "/synthesize", "/speakers", "/health", "/docs"],
+        endpoints=["/tts", "/synthesize", "/synthesize/binary", "/speakers", "/health", "/docs"],
         supported_languages=["EN", "ES", "FR", "ZH", "JP", "KR"],
         max_text_length=settings.MAX_TEXT_LENGTH,
         supported_formats=["wav", "mp3"]
@@ -128,34 +182,167 @@ def get_speakers():
     )
 
 # ---------- Synthesis Helpers ----------
-def generate_wav_audio(text: str, speaker: str, speed: float) -> io.BytesIO:
-    """Generate WAV audio from text"""
-    logger.info("🎵 Synthesizing (WAV) | speaker=%s, speed=%s, text='%s...'", speaker, speed, text[:30])
-    
+def _to_pcm16(audio: np.ndarray) -> bytes:
+    """Convert float32 audio to mono int16 PCM bytes, clipping to [-1, 1] first"""
+    # One contiguous float32 scratch buffer keeps every step on NumPy's vectorized loops
+    samples = np.clip(np.ascontiguousarray(audio, dtype=np.float32), -1.0, 1.0)
+    samples *= 32767.0
+    return samples.astype(np.int16).tobytes()
+
+async def _get_cached_pcm(key: Tuple[str, int, float]) -> Optional[bytes]:
+    """Look up PCM in the startup preview store, then the LRU cache, then the shared disk cache"""
+    pcm = preview_cache.get(key)
+    if pcm is None:
+        pcm = pcm_cache.get(key)
+    if pcm is None and disk_cache is not None:
+        loop = asyncio.get_running_loop()
+        pcm = await loop.run_in_executor(executor, disk_cache.get, key)
+        if pcm is not None:
+            # Promote into the LRU only; the entry is already on disk
+            pcm_cache.put(key, pcm)
+    return pcm
+
+async def _cache_pcm(key: Tuple[str, int, float], pcm: bytes) -> None:
+    """Store PCM in the LRU cache and the shared disk cache"""
+    pcm_cache.put(key, pcm)
+    if disk_cache is not None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, disk_cache.put, key, pcm)
+
+async def _synthesize_pcm(text: str, speaker_id: int, speed: float) -> bytes:
+    """Run the model and return mono int16 PCM bytes (cached on text, speaker and speed)"""
+    key = (text, speaker_id, speed)
+    pcm = await _get_cached_pcm(key)
+    if pcm is None:
+        audio = await batcher.synthesize(text, speaker_id, speed)
+        pcm = _to_pcm16(audio)
+        await _cache_pcm(key, pcm)
+    return pcm
+
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+def _wav_header_fields(sample_rate: int, data_size: Optional[int]) -> tuple:
+    """Field values for `_WAV_HEADER`; an unknown data size marks a streaming WAV"""
+    riff_size = 0xFFFFFFFF if data_size is None else 36 + data_size
+    data_size = 0xFFFFFFFF if data_size is None else data_size
+    return (
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", data_size
+    )
+
+def _wav_header(sample_rate: int, data_size: Optional[int] = None) -> bytes:
+    """Build a 44-byte mono int16 WAV header
+
+    Without a data size the RIFF and data chunk sizes are set to 0xFFFFFFFF, which
+    players treat as "read until end of stream" so playback can start immediately.
+    """
+    return _WAV_HEADER.pack(*_wav_header_fields(sample_rate, data_size))
+
+def _pack_wav(pcm: bytes, sample_rate: int) -> bytearray:
+    """Pack int16 PCM into a complete WAV using a single buffer sized up front"""
+    wav = bytearray(_WAV_HEADER.size + len(pcm))
+    _WAV_HEADER.pack_into(wav, 0, *_wav_header_fields(sample_rate, len(pcm)))
+    wav[_WAV_HEADER.size:] = pcm
+    return wav
+
+def _read_preview(path: Path, sample_rate: int) -> Optional[bytes]:
+    """Return the PCM of a persisted preview, or None if it is missing, truncated or from another model"""
+    try:
+        wav = path.read_bytes()
+    except OSError:
+        return None
+    pcm = wav[_WAV_HEADER.size:]
+    # The header records the sample rate and data size it was written with; both must still match
+    if wav[:_WAV_HEADER.size] != _wav_header(sample_rate, len(pcm)):
+        return None
+    return pcm
+
+def _write_preview(path: Path, wav: Union[bytes, bytearray]) -> None:
+    """Persist a preview WAV atomically, so a crash mid-write never leaves a partial file in place"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(wav)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+async def _load_previews() -> None:
+    """Fill the preview store for every speaker, reusing WAVs persisted by earlier runs"""
+    preview_dir = Path(settings.MODEL_CACHE_DIR) / "previews"
+    sample_rate = tts_model.hps.data.sampling_rate
+    for speaker, speaker_id in SPK_ID.items():
+        for phrase in settings.PREVIEW_PHRASES:
+            path = preview_dir / speaker / f"{hashlib.sha1(phrase.encode('utf-8')).hexdigest()}.wav"
+            pcm = _read_preview(path, sample_rate)
+            if pcm is None:
+                pcm = _to_pcm16(await batcher.synthesize(phrase, speaker_id, 1.0))
+                try:
+                    _write_preview(path, _pack_wav(pcm, sample_rate))
+                except OSError as e:
+                    # Previews still work from memory; they are just re-synthesized next startup
+                    logger.warning("⚠️ Could not persist voice preview %s: %s", path, e)
+            preview_cache[(phrase, speaker_id, 1.0)] = pcm
+    logger.info("🗂️ Loaded %d voice previews", len(preview_cache))
+
+def _encode_mp3(pcm: bytes, sample_rate: int) -> bytes:
+    """Encode raw int16 PCM to MP3 in-process with LAME"""
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(settings.MP3_BITRATE)
+    encoder.set_in_sample_rate(sample_rate)
+    encoder.set_channels(1)
+    encoder.set_quality(2)
+    return bytes(encoder.encode(pcm) + encoder.flush())
+
+def _validate_request(speaker: str) -> None:
+    """Validate synthesis input against the loaded model"""
     if not model_ready:
         raise RuntimeError("Model is not ready")
     
-    if speaker not in tts_model.hps.data.spk2id:
+    if speaker not in SPK_SET:
         raise ValueError(f"Speaker '{speaker}' not found")
+
+async def stream_wav_audio(text: str, speaker_id: int, speed: float) -> AsyncIterator[bytes]:
+    """Stream WAV audio from text, emitting each sentence as soon as it is synthesized"""
+    logger.info("🎵 Synthesizing (WAV) | speaker_id=%s, speed=%s, text='%s...'", speaker_id, speed, text[:30])
+    sample_rate = tts_model.hps.data.sampling_rate
+    key = (text, speaker_id, speed)
     
-    if len(text) > settings.MAX_TEXT_LENGTH:
-        raise ValueError(f"Text too long. Maximum length: {settings.MAX_TEXT_LENGTH}")
+    pcm = await _get_cached_pcm(key)
+    if pcm is not None:
+        yield _wav_header(sample_rate, len(pcm))
+        yield pcm
+        return
     
-    audio_io = io.BytesIO()
-    tts_model.tts_to_file(text, tts_model.hps.data.spk2id[speaker], audio_io, speed=speed, format='wav')
-    audio_io.seek(0)
-    return audio_io
+    yield _wav_header(sample_rate)
+    chunks = []
+    try:
+        async for audio in batcher.stream(text, speaker_id, speed):
+            chunk = _to_pcm16(audio)
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        logger.error("❌ TTS streaming failed: %s", e)
+        raise
+    await _cache_pcm(key, b"".join(chunks))
+
+async def generate_mp3_audio(text: str, speaker_id: int, speed: float) -> bytes:
+    """Generate MP3 audio from text"""
+    logger.info("🎵 Synthesizing (MP3) | speaker_id=%s, speed=%s, text='%s...'", speaker_id, speed, text[:30])
+    pcm = await _synthesize_pcm(text, speaker_id, speed)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _encode_mp3, pcm, tts_model.hps.data.sampling_rate)
 
-def generate_base64_mp3(text: str, speaker: str, speed: float) -> str:
+async def generate_base64_mp3(text: str, speaker_id: int, speed: float) -> str:
     """Generate Base64 encoded MP3 audio from text"""
-    logger.info("🎵 Synthesizing (MP3) | speaker=%s, speed=%s, text='%s...'", speaker, speed, text[:30])
-    
-    wav_io = generate_wav_audio(text, speaker, speed)
-    audio_segment = AudioSegment.from_file(wav_io, format="wav")
-    mp3_io = io.BytesIO()
-    audio_segment.export(mp3_io, format="mp3")
-    mp3_io.seek(0)
-    return base64.b64encode(mp3_io.read()).decode("utf-8")
+    mp3_bytes = await generate_mp3_audio(text, speaker_id, speed)
+    return binascii.b2a_base64(mp3_bytes, newline=False).decode("ascii")
 
 # ---------- Streaming Endpoint ----------
 @app.post("/tts", response_class=StreamingResponse)
@@ -168,26 +355,17 @@ async def synthesize(request: TTSRequest):
         )
     
     try:
-        loop = asyncio.get_event_loop()
-        audio_io = await loop.run_in_executor(
-            executor, 
-            generate_wav_audio, 
-            request.text, 
-            request.speaker, 
-            request.speed
-        )
-        return StreamingResponse(
-            audio_io, 
-            media_type="audio/wav",
-            headers={
-                "Content-Disposition": f"attachment; filename=speech_{request.speaker}.wav"
-            }
-        )
+        _validate_request(request.speaker)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
-    except Exception as e:
-        logger.error("❌ TTS synthesis failed: %s", e)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Synthesis failed") from e
+    
+    return StreamingResponse(
+        stream_wav_audio(request.text, SPK_ID[request.speaker], request.speed),
+        media_type="audio/wav",
+        headers={
+            "Content-Disposition": f"attachment; filename=speech_{request.speaker}.wav"
+        }
+    )
 
 # ---------- Base64 MP3 Endpoint ----------
 @app.post("/synthesize", response_model=TTSResponse)
@@ -200,14 +378,8 @@ async def synthesize_base64(request: TTSRequest):
         )
     
     try:
-        loop = asyncio.get_event_loop()
-        base64_audio = await loop.run_in_executor(
-            executor, 
-            generate_base64_mp3, 
-            request.text, 
-            request.speaker, 
-            request.speed
-        )
+        _validate_request(request.speaker)
+        base64_audio = await generate_base64_mp3(request.text, SPK_ID[request.speaker], request.speed)
         
         return TTSResponse(
             audio_content=base64_audio,
@@ -219,4 +391,46 @@ async def synthesize_base64(request: TTSRequest):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
     except Exception as e:
         logger.error("❌ TTS synthesis failed: %s", e)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Synthesis failed") from e
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Synthesis failed") from e
+
+# ---------- Binary MP3 Endpoint ----------
+@app.post("/synthesize/binary", response_class=Response)
+async def synthesize_binary(request: TTSRequest):
+    """Synthesize speech and return raw MP3 bytes"""
+    if not model_ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model is not ready yet"
+        )
+    
+    try:
+        _validate_request(request.speaker)
+        mp3_bytes = await generate_mp3_audio(request.text, SPK_ID[request.speaker], request.speed)
+        return Response(
+            content=mp3_bytes,
+            media_type="audio/mpeg",
+            headers={
+                "Content-Disposition": f"attachment; filename=speech_{request.speaker}.mp3"
+            }
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    except Exception as e:
+        logger.error("❌ TTS synthesis failed: %s", e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Synthesis failed") from e
+
+# ---------- Entry Point ----------
+def main():
+    """Run the API server (used by `python main.py` and the `melotts-api` console script)"""
+    config = uvicorn.Config(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        loop="auto",  # uvloop where installed (it is not available on Windows)
+        http="httptools",
+        log_level=settings.LOG_LEVEL.lower()
+    )
+    uvicorn.Server(config).run()
+
+if __name__ == "__main__":
+    main()
@@ -2,28 +2,19 @@
 Pydantic models for API request/response validation
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, List, Optional, Dict, Any
+
+from config import settings
 
 class TTSRequest(BaseModel):
     """Request model for TTS synthesis"""
-    text: str = Field(..., min_length=1, max_length=1000, description="Text to synthesize")
+    # Whitespace-only and over-long text is rejected here, before it reaches the model
+    text: Annotated[
+        str, StringConstraints(strip_whitespace=True, min_length=1, max_length=settings.MAX_TEXT_LENGTH)
+    ] = Field(..., description="Text to synthesize")
     speaker: str = Field(default="EN-US", description="Speaker voice to use")
     speed: float = Field(default=1.0, ge=0.5, le=2.0, description="Speech speed (0.5-2.0)")
-    
-    @validator('text')
-    def validate_text(cls, v):
-        """Validate text input"""
-        if not v.strip():
-            raise ValueError("Text cannot be empty")
-        return v.strip()
-    
-    @validator('speed')
-    def validate_speed(cls, v):
-        """Validate speed parameter"""
-        if not 0.5 <= v <= 2.0:
-            raise ValueError("Speed must be between 0.5 and 2.0")
-        return v
 
 class TTSResponse(BaseModel):
     """Response model for base64 TTS synthesis"""
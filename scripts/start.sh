@@ -49,4 +49,4 @@ echo "🌐 Starting server on port $PORT"
 echo "🔧 CUDA_VISIBLE_DEVICES=$CUDA_VISIBLE_DEVICES"
 
 # Start the server
-exec uvicorn main:app --host 0.0.0.0 --port $PORT --reload
+exec uvicorn main:app --host 0.0.0.0 --port $PORT --loop uvloop --http httptools --reload
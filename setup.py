@@ -17,13 +17,19 @@ def read_requirements():
         for line in fh:
             line = line.strip()
             if line and not line.startswith("#") and not line.startswith("-e"):
+                # Keep environment markers (e.g. sys_platform) but skip dev-only lines,
+                # which are declared in extras_require below
+                line, _, marker = line.partition(";")
+                marker = marker.strip()
+                if "extra" in marker:
+                    continue
                 # Remove version constraints for setup.py
                 if "==" in line:
-                    requirements.append(line.split("==")[0])
+                    line = line.split("==")[0]
                 elif ">=" in line:
-                    requirements.append(line.split(">=")[0])
-                else:
-                    requirements.append(line)
+                    line = line.split(">=")[0]
+                line = line.strip()
+                requirements.append(f"{line}; {marker}" if marker else line)
         return requirements
 
 setup(
@@ -41,6 +47,7 @@ setup(
         "Documentation": "https://github.com/yourusername/MeloTTS-API#readme",
     },
     packages=find_packages(),
+    py_modules=["main", "config", "models", "batching", "cache"],
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Intended Audience :: Developers",
@@ -64,9 +71,11 @@ setup(
             "mypy>=1.0.0",
             "isort>=5.12.0",
             "pytest>=7.0.0",
-            "pytest-asyncio>=0.21.0",
+            "pytest-asyncio>=0.24.0",
+            "pytest-xdist>=3.5.0",
             "pytest-cov>=4.0.0",
-            "httpx>=0.24.0",
+            "httpx[http2,brotli]>=0.24.0",
+            "orjson>=3.9.0",
             "mkdocs>=1.4.0",
             "mkdocs-material>=9.0.0",
             "pre-commit>=3.0.0",
@@ -0,0 +1,138 @@
+"""
+Unit tests for the audio caches and WAV helpers (no running server needed)
+"""
+
+import hashlib
+import struct
+
+import pytest
+
+from cache import DiskCache, LRUCache
+
+@pytest.fixture(scope="module")
+def main_module():
+    """Import the server module lazily; it pulls in the full model stack"""
+    return pytest.importorskip("main")
+
+class TestLRUCache:
+    """Test cases for the in-memory LRU cache"""
+
+    def test_evicts_least_recently_used_entry(self):
+        """Test that the entry count bound evicts the oldest untouched entry"""
+        cache = LRUCache(maxsize=2)
+        cache.put("a", b"1")
+        cache.put("b", b"2")
+        assert cache.get("a") == b"1"  # "b" is now least recently used
+        cache.put("c", b"3")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert cache.get("c") == b"3"
+
+    def test_zero_maxsize_disables_caching(self):
+        """Test that maxsize=0 stores nothing"""
+        cache = LRUCache(maxsize=0)
+        cache.put("a", b"1")
+        assert len(cache) == 0
+        assert cache.get("a") is None
+
+    def test_byte_bound_evicts_until_under_limit(self):
+        """Test that exceeding maxbytes evicts oldest entries and keeps nbytes in step"""
+        cache = LRUCache(maxsize=10, maxbytes=10)
+        cache.put("a", b"12345")
+        cache.put("b", b"1234")
+        cache.put("c", b"123")
+        assert cache.get("a") is None
+        assert cache.nbytes == 7
+        assert len(cache) == 2
+
+    def test_oversize_value_is_rejected(self):
+        """Test that a value larger than maxbytes is not stored and evicts nothing"""
+        cache = LRUCache(maxsize=10, maxbytes=10)
+        cache.put("a", b"123")
+        cache.put("big", b"x" * 11)
+        assert cache.get("big") is None
+        assert cache.get("a") == b"123"
+        assert cache.nbytes == 3
+
+    def test_replacing_key_updates_byte_count(self):
+        """Test that overwriting a key subtracts the old value's size"""
+        cache = LRUCache(maxsize=10, maxbytes=10)
+        cache.put("a", b"12345")
+        cache.put("a", b"12")
+        assert cache.nbytes == 2
+        assert len(cache) == 1
+        assert cache.get("a") == b"12"
+
+    def test_custom_sizeof(self):
+        """Test that byte accounting uses the supplied sizeof"""
+        cache = LRUCache(maxsize=10, maxbytes=5, sizeof=lambda value: value["size"])
+        cache.put("a", {"size": 3})
+        cache.put("b", {"size": 3})
+        assert cache.get("a") is None
+        assert cache.nbytes == 3
+
+class TestDiskCache:
+    """Test cases for the shared on-disk cache"""
+
+    @pytest.fixture
+    def disk_cache(self, tmp_path):
+        """Disk cache in a throwaway directory"""
+        cache = DiskCache(str(tmp_path), size_limit=1 << 20, namespace="EN")
+        yield cache
+        cache.close()
+
+    def test_digest_is_stable_across_processes(self, disk_cache):
+        """Test that keys hash to a fixed SHA-1, not Python's per-process salted hash()"""
+        assert disk_cache.digest(("Hello", 0, 1.0)) == hashlib.sha1(b"EN|Hello|0|1.0").digest()
+
+    def test_digest_depends_on_namespace(self, disk_cache, tmp_path):
+        """Test that the same key in different languages maps to different entries"""
+        other = DiskCache(str(tmp_path / "es"), size_limit=1 << 20, namespace="ES")
+        try:
+            assert disk_cache.digest(("Hello", 0, 1.0)) != other.digest(("Hello", 0, 1.0))
+        finally:
+            other.close()
+
+    def test_put_get_roundtrip(self, tmp_path):
+        """Test that a stored value is read back by an independent handle on the same directory"""
+        writer = DiskCache(str(tmp_path), size_limit=1 << 20, namespace="EN")
+        writer.put(("Hello", 0, 1.0), b"pcm")
+        writer.close()
+        reader = DiskCache(str(tmp_path), size_limit=1 << 20, namespace="EN")
+        try:
+            assert reader.get(("Hello", 0, 1.0)) == b"pcm"
+            assert reader.get(("Hello", 1, 1.0)) is None
+        finally:
+            reader.close()
+
+class TestWavHelpers:
+    """Test cases for the WAV header and packing helpers"""
+
+    def test_streaming_header(self, main_module):
+        """Test that a header without a data size marks both chunk sizes as unknown"""
+        header = main_module._wav_header(44100)
+        assert len(header) == 44
+        riff, riff_size, wave = struct.unpack_from("<4sI4s", header)
+        assert (riff, riff_size, wave) == (b"RIFF", 0xFFFFFFFF, b"WAVE")
+        assert struct.unpack_from("<4sI", header, 36) == (b"data", 0xFFFFFFFF)
+
+    def test_sized_header_fields(self, main_module):
+        """Test mono int16 format fields and chunk sizes for a known data size"""
+        header = main_module._wav_header(22050, 1000)
+        _, riff_size, _, fmt, fmt_size, codec, channels, rate, byte_rate, align, bits, data, size = (
+            struct.unpack("<4sI4s4sIHHIIHH4sI", header)
+        )
+        assert riff_size == 36 + 1000
+        assert (fmt, fmt_size, codec, channels) == (b"fmt ", 16, 1, 1)
+        assert (rate, byte_rate, align, bits) == (22050, 44100, 2, 16)
+        assert (data, size) == (b"data", 1000)
+
+    def test_pack_wav(self, main_module):
+        """Test that packing prefixes the PCM with a matching sized header"""
+        pcm = b"\x01\x00" * 8
+        wav = main_module._pack_wav(pcm, 44100)
+        assert bytes(wav[:44]) == main_module._wav_header(44100, len(pcm))
+        assert bytes(wav[44:]) == pcm
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])